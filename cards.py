@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
 from enum import Enum, IntEnum  # For suits and ranks of cards
-from random import shuffle  # For shuffling cards in a deck
-from termcolor import colored  # For colored card text
+from random import Random  # For shuffling cards in a deck
+from collections import deque  # For a bounded turn history
 import doctest  # For simple testing
 
 """ CONSTANTS """
@@ -50,87 +50,174 @@ RANK_TO_STR = {Rank.ACE: 'A',  # For converting rank to string
                Rank.QUEEN: 'Q',
                Rank.KING: 'K'}
 
+FACE_RANKS = frozenset(int(rank) for rank in (Rank.ACE, Rank.JACK, Rank.QUEEN, Rank.KING))  # Face ranks, as plain ints
+RED_SUITS = frozenset(suit.value for suit in (Suit.DIAMOND, Suit.HEART))  # Suits of red cards, as plain ints
+
+FACE_MASK = sum(1 << rank for rank in FACE_RANKS)  # Bit n is set when rank n is a face rank
+
+ANSI_COLORS = {'red': '\x1b[31m', 'white': '\x1b[37m'}  # Escape codes for card text colors
+ANSI_BOLD = '\x1b[1m'
+ANSI_RESET = '\x1b[0m'
+
+RANK_MASK = 0x0F  # Low nibble of a card code holds the rank
+SUIT_SHIFT = 4  # High nibble of a card code holds the suit
+COLOR_BIT = 1 << SUIT_SHIFT  # Lowest suit bit, set for white suits and clear for red suits
+
+TURN_HISTORY_LIMIT = 1024  # Number of turns a game state remembers, the oldest are dropped first
+
+
+def card_code(rank: Rank, suit: Suit) -> int:
+    """Encodes a rank and suit as a single byte, with the rank in the low nibble and the suit in the high nibble."""
+    return rank | (suit.value << SUIT_SHIFT)
+
+
+def code_rank(code: int) -> int:
+    return code & RANK_MASK
+
+
+def code_suit(code: int) -> int:
+    return code >> SUIT_SHIFT
+
+
+def card_str(rank: Rank, suit: Suit) -> str:
+    """Builds the colored string for a card out of ANSI escape codes, bold for face cards."""
+
+    text = RANK_TO_STR[rank] + (' ' if rank == Rank.TEN else '  ') + SUIT_TO_STR[suit]
+    color = ANSI_COLORS['red' if suit.value in RED_SUITS else 'white']
+
+    return (ANSI_BOLD if rank in FACE_RANKS else '') + color + text + ANSI_RESET
+
+
+CARD_STR = {card_code(rank, suit): card_str(rank, suit) for suit in Suit for rank in Rank}  # Keyed by card code
+
 """ CLASSES """
 
 
 class Card:
     """Represents a single card in a french suited, standard 52 card deck."""
 
-    rank = None
-    suit = None
+    __slots__ = ('rank', 'suit', 'code', 'face', 'red', 'color', 'text')
 
     def __init__(self, rank: Rank, suit: Suit):
         self.rank = rank
         self.suit = suit
+        self.code = card_code(rank, suit)  # Integer encoding used by hot paths instead of attribute lookups
+        self.face = FACE_MASK >> rank & 1 == 1  # Cached since cards never change
+        self.red = self.code & COLOR_BIT == 0
+        self.color = 'red' if self.red else 'white'
+        self.text = CARD_STR[self.code]  # Colored string, built once per card code at import
 
     def is_face(self) -> bool:
-        return self.rank in [Rank.ACE, Rank.JACK, Rank.QUEEN, Rank.KING]
+        return self.face
 
     def is_pip(self) -> bool:
-        return self.rank not in [Rank.ACE, Rank.JACK, Rank.QUEEN, Rank.KING]
+        return not self.face
 
     def is_red(self) -> bool:
-        return self.suit in [Suit.DIAMOND, Suit.HEART]
+        return self.red
 
     def is_white(self) -> bool:
-        return self.suit in [Suit.SPADE, Suit.CLUB]
+        return not self.red
 
     def get_color(self) -> str:
-        return 'red' if self.is_red() else 'white'
+        return self.color
 
     def is_same_color(self, other: 'Card') -> bool:
-        return self.get_color() == other.get_color()
+        return self.red == other.red
 
     def to_str(self) -> str:
-        card_str = RANK_TO_STR[self.rank] + (' ' if self.rank == Rank.TEN else '  ') + SUIT_TO_STR[self.suit]
+        return self.text
+
+
+CARD_POOL = {(rank, suit): Card(rank, suit) for suit in Suit for rank in Rank}  # One shared instance per card
+
+
+CODE_TO_CARD = {card.code: card for card in CARD_POOL.values()}  # For turning card codes back into cards
+
+
+def get_card(rank: Rank, suit: Suit) -> Card:
+    """Returns the shared Card for a rank and suit, cards are immutable so every deck can reuse them."""
+    return CARD_POOL[(rank, suit)]
+
+
+def card_from_code(code: int) -> Card:
+    """Returns the shared Card for a card code, the inverse of Card.code."""
+    return CODE_TO_CARD[code]
 
-        if self.is_face():
-            return colored(card_str, self.get_color(), attrs=['bold'])
-        else:
-            return colored(card_str, self.get_color())
+
+FULL_DECK = tuple(CARD_POOL.values())  # Full deck, 52 cards unsorted, top card is last
+
+DECK_RNG = Random()  # Seeded once, shared by every deck shuffled without a generator of its own
+
+DECK_FACTORIES = {'full': lambda: list(FULL_DECK),  # For building the cards of a named deck
+                  'empty': list}
 
 
 class Deck:
-    """Represents an entire french suited, standard 52 card deck."""
+    """Represents an entire french suited, standard 52 card deck.
+    Drawn cards stay in the list past top, so the deck can be reset without building it again.
+    """
 
-    cards = [Card(rank, suit) for suit in Suit for rank in Rank]  # 52 card deck unsorted default, top card is last
+    __slots__ = ('cards', 'top')
 
     def __init__(self, ranks='full'):
-        if ranks == 'full':  # Full deck
-            pass
-        elif ranks == 'empty':  # Empty deck
-            self.cards = []
-        elif isinstance(ranks, list):  # List of desired ranks, ex. [SIX, SEVEN, EIGHT, KING]
-            self.cards = [Card(rank, suit) for rank in ranks for suit in Suit]
+        if isinstance(ranks, list):  # List of desired ranks, ex. [SIX, SEVEN, EIGHT, KING]
+            self.cards = [get_card(rank, suit) for rank in ranks for suit in Suit]
+        elif isinstance(ranks, str) and ranks in DECK_FACTORIES:  # Named deck, 'full' or 'empty'
+            self.cards = DECK_FACTORIES[ranks]()
         else:  # invalid arg
             self.cards = None
             raise ValueError  # TODO find better error type
+        self.top = len(self.cards)  # Number of cards not drawn yet, the top card is the one before it
+
+    def shuffle(self, rng: Random = None):
+        """Shuffles the cards not drawn yet."""
 
-    def shuffle(self):
-        shuffle(self.cards)
+        cards = self.cards if self.top == len(self.cards) else self.cards[:self.top]
+        (DECK_RNG if rng is None else rng).shuffle(cards)
+        if cards is not self.cards:
+            self.cards[:self.top] = cards
+
+    def reset(self, rng: Random = None):
+        """Puts every drawn card that wasn't replaced by an added card back into the deck, and shuffles all of it."""
+        self.top = len(self.cards)
+        self.shuffle(rng)
 
     def show(self):
-        for i in range(len(self.cards)):
+        for i in range(self.top):
             print(str(i) + ':', self.cards[i].to_str())
 
     def draw(self) -> Card:
-        return None if len(self.cards) == 0 else self.cards.pop()
+        if self.top == 0:
+            return None
+        self.top -= 1
+        return self.cards[self.top]
 
     def add(self, card: Card):
-        self.cards.append(card)
+        """Adds a card on top, taking the place of the last card drawn if there is one."""
+
+        if self.top < len(self.cards):
+            self.cards[self.top] = card
+        else:
+            self.cards.append(card)
+        self.top += 1
 
 
 class CardGameState:
     """Represents the history of a game, allowing turns to be reversed or a game to be resumed."""
 
-    turn_history = []
-    ready_to_exit = False
-    is_won = False
-    win_count = 0
-    status_line = ''
-    command = ''
-    command_args = []
+    __slots__ = ('deck', 'debug_mode', 'turn_history', 'ready_to_exit', 'is_won', 'win_count', 'status_line',
+                 'command', 'command_args')
 
     def __init__(self, ranks, debug_mode=False):
         self.deck = Deck(ranks)
         self.debug_mode = debug_mode
+
+        # Set per instance, so states never share a history or command args
+        self.turn_history = deque(maxlen=TURN_HISTORY_LIMIT)
+        self.ready_to_exit = False
+        self.is_won = False
+        self.win_count = 0
+        self.status_line = ''
+        self.command = ''
+        self.command_args = []
@@ -1,8 +1,17 @@
 #!/usr/bin/env python
 
-from cards import Card, Deck, Rank, CardGameState
-from sys import argv  # For handling command line args
-import os  # For clearing shell
+from cards import (Card, Deck, Rank, Suit, CardGameState, card_code, CARD_STR,
+                   FACE_MASK, RANK_MASK, SUIT_SHIFT, COLOR_BIT)
+import sys  # For handling command line args and writing frames
+from random import Random  # For a reseedable shuffle per game state
+import os  # For detecting Windows consoles and counting CPUs
+from multiprocessing import Pool  # For searching the branches of a solve at the same time
+from array import array  # For storing the cells of many games compactly
+
+try:
+    import readline  # Gives input line editing and a history of previous commands, just by being imported
+except ImportError:  # Not available on every platform, input works the same without it
+    readline = None
 
 """
 TITLE: Pasyans (пасьянс in Russian, "patience" in English)
@@ -18,102 +27,666 @@ class PasyansGameState(CardGameState):
     ranks = [Rank.SIX, Rank.SEVEN, Rank.EIGHT, Rank.NINE, Rank.TEN, Rank.JACK, Rank.QUEEN, Rank.KING, Rank.ACE]
     command_aliases = {'move': ['move', 'mv'],
                        'exit': ['exit', 'end', 'quit'],
-                       'win': ['win']}
+                       'win': ['win'],
+                       'solve': ['solve'],
+                       'undo': ['undo']}
     cell_names = ['1', '2', '3', '4', '5', '6', '7', '8', '9', 'F', 'f']
 
-    def __init__(self, debug_mode=False):
+    __slots__ = ('rng', 'cells', 'free_cell', 'sorted_len', 'zobrist_key', 'max_height')
+
+    def __init__(self, debug_mode=False, seed=None):
         super().__init__(self.ranks, debug_mode)
-        self.deck.shuffle()
-        self.cells = [[self.deck.draw() for i in range(4)] for j in range(9)]
+        self.rng = Random(seed)  # Kept on the state so games can be reseeded or replayed cheaply
+        self.deal()
+
+    def deal(self):
+        """Shuffles the codes of the deck's cards and deals them into the nine cells, four cards each.
+        Cells hold card codes rather than Card objects, and the free cell holds a code or None.
+        """
+        self.cells = pasyans_deal_codes(self.rng)
         self.free_cell = None
+        self.refresh()
+
+    def refresh(self):
+        """Rebuilds everything cached about the cells, needed whenever they are replaced rather than moved between."""
+
+        # Length of the run of cards in a valid order at the top of each cell, updated on every move
+        self.sorted_len = [pasyans_max_stack_size(cell) if cell else 0 for cell in self.cells]
+
+        # Zobrist key of the current cells, updated on every move
+        self.zobrist_key = pasyans_zobrist_key(pasyans_encode(self))
+
+        # Number of cards in the tallest cell, updated on every move so frames know how many rows to draw
+        self.max_height = max(map(len, self.cells))
 
     def reset_game(self):
-        self.deck = Deck(self.ranks)
-        self.deck.shuffle()
-        self.cells = [[self.deck.draw() for i in range(4)] for j in range(9)]
-        self.free_cell = None
+        self.deal()
 
-        self.turn_history = []
+        self.turn_history.clear()
         self.is_won = False
 
 
+PASYANS_DECK_CODES = tuple(card.code for card in Deck(PasyansGameState.ranks).cards)  # Shuffled per deal
+
+
+def pasyans_deal_codes(rng: Random) -> list:
+    """Shuffles the card codes of a Pasyans deck with rng and deals them into nine cells, four codes each."""
+
+    codes = list(PASYANS_DECK_CODES)
+    rng.shuffle(codes)
+    return [codes[i:i + 4] for i in range(0, len(codes), 4)]
+
+PASYANS_ALIAS_TO_COMMAND = {alias: command for command, aliases in PasyansGameState.command_aliases.items()
+                            for alias in aliases}  # For looking up the command an alias belongs to
+
+
+class PasyansBatchState:
+    """Represents many Pasyans games as encoded cells, so they can be stepped together without rendering or input."""
+
+    __slots__ = ('cells', 'keys')
+
+    def __init__(self, seeds: list):
+        # Dealt without a game state, each cell an array of one byte per code, since a batch may hold many games
+        self.cells = [[array('B', cell) for cell in pasyans_deal_codes(Random(seed))] + [array('B')] for seed in seeds]
+        self.keys = [pasyans_zobrist_key(cells) for cells in self.cells]  # Zobrist key of each game
+
+    def step(self, actions: list) -> list:
+        """Applies one (src, dst) move to each game by cell index, returning whether each game is won after it.
+        Moves that break the rules leave their game unchanged, the same as the move command.
+        """
+
+        won = []
+        for i, (src, dst) in enumerate(actions):
+            cells = self.cells[i]
+            stack_size = pasyans_code_move_size(cells, src, dst)
+            if stack_size:
+                src_cell = cells[src]
+                self.keys[i] ^= pasyans_zobrist_delta(src, len(src_cell), dst, len(cells[dst]), src_cell[-stack_size:])
+                pasyans_code_transfer(cells, src, dst, stack_size)
+            won.append(pasyans_code_won(cells))
+        return won
+
+
+PASYANS_GAP = '    '  # Space between cells in a row
+PASYANS_EMPTY_CELL = '[  ]'  # Drawn in place of the bottom card of an empty cell
+PASYANS_CARD_SLOT = {code: text + PASYANS_GAP for code, text in CARD_STR.items()}  # Card then gap, keyed by code
+PASYANS_EMPTY_SLOT = PASYANS_EMPTY_CELL + PASYANS_GAP
+PASYANS_BLANK_SLOT = PASYANS_GAP + PASYANS_GAP  # Above the top card of a shorter cell
+PASYANS_FULL_BAR = '═' * 76  # Status line when there is no status to show
+PASYANS_CLEAR = '\x1b[H\x1b[2J'  # Moves the cursor home and clears the terminal, without running a shell command
+PASYANS_CELL_NUMBERS = ''.join(' ' + str(i + 1) + '      ' for i in range(9)) + ' F'  # Labels under the cells
+
+
+def pasyans_enable_ansi():
+    """Turns on ANSI escape code handling in the Windows console, which the colors and clearing rely on.
+    Other terminals handle them already, so this does nothing elsewhere.
+    """
+
+    if os.name == 'nt':
+        import ctypes  # Only needed on Windows
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # Standard output
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):  # Fails when output is not a console
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+
+
 def pasyans_show(gs: PasyansGameState):
     """Displays the current game state."""
 
-    # Clear terminal
-    os.system('cls' if os.name == 'nt' else 'clear')
+    # Build every line of the frame first so it can be written at once
+    card_slot = PASYANS_CARD_SLOT
+    lines = []
 
-    # Print status line
-    print('═> ' + gs.status_line + ' <' + '═' * (71 - len(gs.status_line))
-          if len(gs.status_line) > 0 else '═' * 76)
+    # Status line, the plain bar is prebuilt for turns without a status
+    status = gs.status_line
+    lines.append(f'═> {status} <' + '═' * (71 - len(status)) if status else PASYANS_FULL_BAR)
 
-    # Iterate through row values, then through cells for printing
-    for row in range(max([len(cell) for cell in gs.cells])):
-        for cell in gs.cells:
-            print(cell[row].to_str() if row < len(cell)
-                  else '[  ]' if row == 0 and len(cell) == 0 else '    ', '   ', end='')
+    # Turn each cell into a column of slots padded to the max height, so rows are joined without checking lengths
+    height = gs.max_height
+    columns = [[card_slot[code] for code in cell] + [PASYANS_BLANK_SLOT] * (height - len(cell)) if cell else
+               [PASYANS_EMPTY_SLOT] + [PASYANS_BLANK_SLOT] * (height - 1) for cell in gs.cells]
+
+    # Join each row of slots into one line, with the free cell at the end of the first
+    for row, slots in enumerate(zip(*columns)):
+        line = ''.join(slots)
         if row == 0:
-            print(gs.free_cell.to_str() if gs.free_cell else '[  ]', sep='', end='')
-        print()
+            line += CARD_STR[gs.free_cell] if gs.free_cell else PASYANS_EMPTY_CELL
+        lines.append(line)
+
+    # Blank line between cells and cell numbers, then cell numbers and free cell at the bottom
+    lines.append('')
+    lines.append(PASYANS_CELL_NUMBERS)
+
+    # Clear terminal first, unless output is piped somewhere, then a blank line after the frame for spacing
+    sys.stdout.write((PASYANS_CLEAR if sys.stdout.isatty() else '') + '\n'.join(lines) + '\n\n')
+    sys.stdout.flush()  # Whole frame at once, even when stdout is block buffered
+
+
+def pasyans_code_order(first_code: int, second_code: int) -> bool:
+    """Checks if two encoded cards are in a valid order for Pasyans, as one expression over the codes.
+    Both cards must be face or both pip, then face cards must share a suit, and pip cards must alternate color and
+    decrease by one.
+    """
+
+    diff = first_code ^ second_code
+    first_is_face = FACE_MASK >> (first_code & RANK_MASK) & 1
+    return (first_is_face == FACE_MASK >> (second_code & RANK_MASK) & 1 and
+            (diff >> SUIT_SHIFT == 0 if first_is_face else
+             diff & COLOR_BIT != 0 and (second_code & RANK_MASK) - (first_code & RANK_MASK) == 1))
+
+
+def pasyans_build_valid_order() -> bytes:
+    """Builds a table holding the result of pasyans_code_order for every pair of card codes."""
+
+    table = bytearray(1 << 14)  # Every card code is below 1 << 7, so a pair fits in 14 bits
+    codes = [card_code(rank, suit) for rank in Rank for suit in Suit]
+    for first_code in codes:
+        for second_code in codes:
+            table[first_code << 7 | second_code] = pasyans_code_order(first_code, second_code)
+    return bytes(table)
+
+
+PASYANS_VALID_ORDER = pasyans_build_valid_order()  # Indexed by first.code << 7 | second.code
+
+PASYANS_FREE_INDEX = 9  # Index of the free cell in encoded cells, after the nine cells
+PASYANS_MAX_HEIGHT = 36  # No cell can hold more cards than are dealt
+
+
+def pasyans_build_zobrist() -> list:
+    """Builds a random 64 bit key for every card code at every position, hashing a game state is then an xor of keys.
+    Positions are (cell index, row from the bottom) and every card code is below 1 << 7.
+    """
+
+    rng = Random(0)  # Fixed seed so the same state always hashes to the same key
+    return [rng.getrandbits(64) for _ in range((PASYANS_FREE_INDEX + 1) * PASYANS_MAX_HEIGHT << 7)]
+
 
-    # Add blank line between cells and cell numbers
-    print()
+PASYANS_ZOBRIST = pasyans_build_zobrist()  # Indexed by (cell * PASYANS_MAX_HEIGHT + row) << 7 | code
 
-    # Print cell numbers and free cell at the bottom
-    for i in range(9):
-        print(' ' + str(i + 1) + '  ', '   ', end='')
-    print(' F')
 
-    # Add blank line at bottom for spacing
-    print()
+def pasyans_zobrist_key(cells: list) -> int:
+    """Hashes encoded cells, including the free cell, into a 64 bit key."""
+
+    zobrist = PASYANS_ZOBRIST
+    key = 0
+    for index, cell in enumerate(cells):
+        for row, code in enumerate(cell):
+            key ^= zobrist[(index * PASYANS_MAX_HEIGHT + row) << 7 | code]
+    return key
+
+
+def pasyans_zobrist_delta(src: int, src_len: int, dst: int, dst_len: int, codes: list) -> int:
+    """Finds what to xor into a zobrist key when codes move from the top of src to the top of dst.
+    src_len and dst_len are the lengths of both cells before the move.
+    """
+
+    zobrist = PASYANS_ZOBRIST
+    src_base = src * PASYANS_MAX_HEIGHT + src_len - len(codes)
+    dst_base = dst * PASYANS_MAX_HEIGHT + dst_len
+    delta = 0
+    for i, code in enumerate(codes):
+        delta ^= zobrist[(src_base + i) << 7 | code] ^ zobrist[(dst_base + i) << 7 | code]
+    return delta
+
+
+PASYANS_KEY_MASK = (1 << 64) - 1  # State keys are summed, so they are kept to 64 bits by hand
+
+
+def pasyans_column_delta(index: int, row: int, codes: list) -> int:
+    """Finds what to xor into the column key of a cell when codes are added or removed from row upwards.
+    Column keys only depend on the rows of codes, not the cell they are in, except the free cell has keys of its own.
+    """
+
+    zobrist = PASYANS_ZOBRIST
+    base = (PASYANS_FREE_INDEX * PASYANS_MAX_HEIGHT if index == PASYANS_FREE_INDEX else 0) + row
+    delta = 0
+    for i, code in enumerate(codes):
+        delta ^= zobrist[(base + i) << 7 | code]
+    return delta
+
+
+def pasyans_canonical_key(cells: list) -> tuple:
+    """Hashes encoded cells into (state key, column keys), where the state key is the same for any order of cells.
+    Cells that are swapped around lead to the same game, so the solver only needs to visit one of them.
+    """
+
+    columns = [pasyans_column_delta(index, 0, cell) for index, cell in enumerate(cells)]
+    return sum(columns) & PASYANS_KEY_MASK, columns
 
 
 def pasyans_valid_order(first: Card, second: Card) -> bool:
     """Checks if two cards are in a valid order for Pasyans."""
+    return PASYANS_VALID_ORDER[first.code << 7 | second.code] == 1
+
+
+def pasyans_check_win(gs: PasyansGameState) -> bool:
+    """Checks whether the current game state is a win."""
+
+    # Free cell must be empty, and every cell must be a single run in a valid order (empty is valid)
+    # The run lengths list is compared to the cell lengths in one go, stopping at the first cell that differs
+    return gs.free_cell is None and gs.sorted_len == list(map(len, gs.cells))
+
+
+def pasyans_max_stack_size(cell: list) -> int:
+    """Counts the codes at the top of a non-empty cell that are in a valid order, and so can be moved together."""
+
+    # Walk down from the top card with a positive index until a pair is out of order
+    valid_order = PASYANS_VALID_ORDER
+    cell_len = len(cell)
+    bottom = cell_len - 1
+    while bottom > 0 and valid_order[cell[bottom] << 7 | cell[bottom - 1]]:
+        bottom -= 1
+    return cell_len - bottom
+
+
+def pasyans_fit_size(src_cell: list, stack_size: int, dst_code: int) -> int:
+    """Finds how many of the stack_size ordered codes at the top of src_cell can move onto dst_code, 0 if none.
+    Face cards of a suit sit on each other in any order, so a face stack fits whole or not at all. A pip stack counts
+    up by one from its top card, so the only card that can fit is one rank below dst_code, and no search is needed.
+    """
+
+    top_code = src_cell[-1]
+    if FACE_MASK >> (top_code & RANK_MASK) & 1:
+        size = stack_size
+    else:
+        size = (dst_code & RANK_MASK) - (top_code & RANK_MASK)
+        if not 0 < size <= stack_size:
+            return 0
+    return size if PASYANS_VALID_ORDER[src_cell[-size] << 7 | dst_code] else 0
+
+
+def pasyans_attempt_move(src_cell: list, dst_cell: list, stack_size: int) -> int:
+    """Moves the largest stack of at most stack_size cards that fits onto dst_cell, returning the number moved."""
+
+    # Find the index the moved stack starts at, an empty dst accepts the whole stack
+    src_len = len(src_cell)
+    split = src_len - (pasyans_fit_size(src_cell, stack_size, dst_cell[-1]) if dst_cell else stack_size)
+
+    # Splice the stack from source to destination cell, bounded by src_len in case both are the same cell
+    if split < src_len:
+        dst_cell.extend(src_cell[split:])
+        del src_cell[split:src_len]
+    return src_len - split
+
+
+PASYANS_SOLVE_NODE_LIMIT = 100000  # Number of new states the solver may visit before giving up
+
+
+def pasyans_encode(gs: PasyansGameState) -> list:
+    """Copies the cells of a game into one list of encoded cells, with the free cell last as a list of 0 or 1 codes."""
+
+    cells = [list(cell) for cell in gs.cells]
+    cells.append([gs.free_cell] if gs.free_cell else [])
+    return cells
+
+
+def pasyans_decode(gs: PasyansGameState, cells: list):
+    """Replaces the cells of a game with encoded cells, the inverse of pasyans_encode."""
+
+    gs.cells = [list(cell) for cell in cells[:PASYANS_FREE_INDEX]]
+    gs.free_cell = cells[PASYANS_FREE_INDEX][0] if cells[PASYANS_FREE_INDEX] else None
+    gs.refresh()
+
 
-    # Check if both cards are face or pip
-    if first.is_face() != second.is_face():
+def pasyans_code_runs(cells: list) -> list:
+    """Finds the length of the run in a valid order at the top of every encoded cell, 0 for empty cells."""
+    return [pasyans_max_stack_size(cell) if cell else 0 for cell in cells]
+
+
+def pasyans_code_moves(cells: list, runs: list) -> list:
+    """Lists the useful moves in encoded cells as (src, dst, stack_size), following the move command's rules.
+    runs holds the top run length of every cell, from pasyans_code_runs.
+    Moves that build on a card come first, then moves into the free cell, then moves into an empty cell.
+    """
+
+    # Bind globals used in the loops to locals, which are faster to look up
+    valid_order, face_mask, rank_mask = PASYANS_VALID_ORDER, FACE_MASK, RANK_MASK
+    build_moves, free_moves, empty_moves = [], [], []
+
+    # Find the top code of every non-empty cell once, instead of once per source cell
+    tops = [(dst, dst_cell[-1]) for dst, dst_cell in enumerate(cells[:PASYANS_FREE_INDEX]) if dst_cell]
+    first_empty = next((i for i in range(PASYANS_FREE_INDEX) if not cells[i]), None)
+    free_is_empty = not cells[PASYANS_FREE_INDEX]
+
+    for src, src_cell in enumerate(cells):
+        if not src_cell:
+            continue
+        src_len = len(src_cell)
+        max_size = runs[src]
+
+        # Move the largest stack that fits onto each top card, the same way as pasyans_fit_size
+        # A lone card or a face stack fits whole or not at all, so it needs a single lookup per cell
+        top_code = src_cell[-1]
+        if max_size == 1 or face_mask >> (top_code & rank_mask) & 1:
+            shifted_code = src_cell[-max_size] << 7
+            for dst, dst_code in tops:
+                if dst != src and valid_order[shifted_code | dst_code]:
+                    build_moves.append((src, dst, max_size))
+
+        # Only the card of a pip stack one rank below the top card of dst can fit, which also rules out src itself
+        else:
+            top_rank = top_code & rank_mask
+            for dst, dst_code in tops:
+                stack_size = (dst_code & rank_mask) - top_rank
+                if 0 < stack_size <= max_size and valid_order[src_cell[-stack_size] << 7 | dst_code]:
+                    build_moves.append((src, dst, stack_size))
+
+        # Empty cells are interchangeable, and moving a whole cell into one changes nothing
+        if first_empty is not None and (src == PASYANS_FREE_INDEX or max_size < src_len):
+            empty_moves.append((src, first_empty, max_size))
+
+        if src != PASYANS_FREE_INDEX and free_is_empty:
+            free_moves.append((src, PASYANS_FREE_INDEX, 1))
+
+    return build_moves + free_moves + empty_moves
+
+
+def pasyans_code_won(cells: list, runs: list = None) -> bool:
+    """Checks whether encoded cells are a win, the same rule as pasyans_check_win.
+    runs holds the top run length of every cell if it is already known, so no cell needs walking.
+    """
+
+    if cells[PASYANS_FREE_INDEX]:
         return False
+    elif runs is None:
+        return all(pasyans_max_stack_size(cell) == len(cell) for cell in cells[:PASYANS_FREE_INDEX] if cell)
+    return all(run == len(cell) for run, cell in zip(runs, cells[:PASYANS_FREE_INDEX]))
+
+
+def pasyans_code_transfer(cells: list, src: int, dst: int, stack_size: int):
+    """Moves the top stack_size codes from one encoded cell to another without checking the rules."""
+    src_cell = cells[src]
+    split = len(src_cell) - stack_size
+    cells[dst].extend(src_cell[split:])
+    del src_cell[split:]
+
+
+def pasyans_code_update_runs(cells: list, runs: list, src: int, dst: int, stack_size: int):
+    """Updates the run lengths of both cells after pasyans_code_transfer moved a stack between them by the rules,
+    the same way pasyans_update_sorted_len does for a game.
+    """
 
-    # Handle face cards
-    elif first.is_face():
-        return first.suit == second.suit
+    dst_cell = cells[dst]
+    dst_len = len(dst_cell) - stack_size
+    if dst_len and PASYANS_VALID_ORDER[dst_cell[dst_len] << 7 | dst_cell[dst_len - 1]]:
+        runs[dst] += stack_size
+    else:
+        runs[dst] = stack_size
 
-    # Handle pip cards
+    if runs[src] > stack_size:
+        runs[src] -= stack_size
     else:
-        return not first.is_same_color(second) and first.rank == second.rank - 1
+        src_cell = cells[src]
+        runs[src] = pasyans_max_stack_size(src_cell) if src_cell else 0
 
 
-def pasyans_check_win(gs: PasyansGameState) -> bool:
-    """Checks whether the current game state is a win."""
+def pasyans_code_move_size(cells: list, src: int, dst: int) -> int:
+    """Finds how many codes a move between encoded cells would carry under the move command's rules, 0 if none."""
+
+    src_cell, dst_cell = cells[src], cells[dst]
+    if not src_cell or src == dst:
+        return 0
 
-    # Check that every cell is in a valid order (empty is valid) and free cell is empty
-    return all([all([pasyans_valid_order(cell[-i], cell[-i - 1]) for i in range(1, len(cell))])
-                if len(cell) > 0 else True for cell in gs.cells]) and not gs.free_cell
+    # The free cell holds a single card
+    elif dst == PASYANS_FREE_INDEX:
+        return 0 if dst_cell else 1
+
+    # Move the largest stack that fits, an empty cell accepts the whole stack
+    stack_size = 1 if src == PASYANS_FREE_INDEX else pasyans_max_stack_size(src_cell)
+    return pasyans_fit_size(src_cell, stack_size, dst_cell[-1]) if dst_cell else stack_size
+
+
+def pasyans_solve_codes(cells: list, node_limit=PASYANS_SOLVE_NODE_LIMIT) -> list:
+    """Searches encoded cells for a winning sequence of (src, dst, stack_size) moves, None if none was found.
+    The search is a depth first search that applies and reverts moves in place, skipping states whose canonical key
+    has already been seen, so reaching the same cells in another order counts as seen.
+    """
+
+    cells = [list(cell) for cell in cells]
+    if pasyans_code_won(cells):
+        return []
+
+    # Bind the functions and constants used on every node to locals, which are faster to look up
+    column_delta, transfer, update_runs = pasyans_column_delta, pasyans_code_transfer, pasyans_code_update_runs
+    code_moves, code_won, key_mask = pasyans_code_moves, pasyans_code_won, PASYANS_KEY_MASK
+
+    key, columns = pasyans_canonical_key(cells)
+    runs = pasyans_code_runs(cells)
+    seen = {key}
+    path = []
+    pending = [iter(pasyans_code_moves(cells, runs))]  # Remaining moves to try at each depth of the path
+
+    while pending:
+        move = next(pending[-1], None)
+
+        # Out of moves at this depth, so step back up the path
+        if move is None:
+            pending.pop()
+            if path:
+                src, dst, stack_size, key, src_column, dst_column, src_run, dst_run = path.pop()
+                transfer(cells, dst, src, stack_size)
+                columns[src], columns[dst] = src_column, dst_column
+                runs[src], runs[dst] = src_run, dst_run
+            continue
+
+        # Hash the state the move leads to before making it, so already seen states cost no copying
+        src, dst, stack_size = move
+        src_cell = cells[src]
+        codes = src_cell[-stack_size:]
+        src_column = columns[src] ^ column_delta(src, len(src_cell) - stack_size, codes)
+        dst_column = columns[dst] ^ column_delta(dst, len(cells[dst]), codes)
+        next_key = (key - columns[src] - columns[dst] + src_column + dst_column) & key_mask
+        if next_key in seen:
+            continue
+
+        # Make the move with the codes already sliced off for hashing, rather than slicing them again
+        path.append((src, dst, stack_size, key, columns[src], columns[dst], runs[src], runs[dst]))
+        cells[dst] += codes
+        del src_cell[-stack_size:]
+        update_runs(cells, runs, src, dst, stack_size)
+        columns[src], columns[dst] = src_column, dst_column
+        key = next_key
+        seen.add(key)
+        if code_won(cells, runs):
+            return [move[:3] for move in path]
+        if len(seen) > node_limit:
+            return None
+        pending.append(iter(code_moves(cells, runs)))
+
+    return None
+
+
+def pasyans_solve(gs: PasyansGameState, node_limit=PASYANS_SOLVE_NODE_LIMIT) -> list:
+    """Searches the current game for a winning sequence of (src, dst, stack_size) moves, None if none was found."""
+
+    return pasyans_solve_codes(pasyans_encode(gs), node_limit)
+
+
+def pasyans_solve_branch(branch: tuple) -> list:
+    """Searches the encoded cells left after one first move, as (cells, move, node_limit), in a worker process.
+    Returns the whole winning sequence starting with that move, None if none was found.
+    """
+
+    cells, move, node_limit = branch
+    cells = [list(cell) for cell in cells]
+    pasyans_code_transfer(cells, *move)
+    solution = pasyans_solve_codes(cells, node_limit)
+    return None if solution is None else [move] + solution
+
+
+def pasyans_solve_parallel(gs: PasyansGameState, node_limit=PASYANS_SOLVE_NODE_LIMIT, processes=None) -> list:
+    """Searches the current game like pasyans_solve, with the branch after each first move in a pool of processes.
+    The node limit is shared out between branches, so the whole search does no more work than pasyans_solve.
+    The first branch in move order that is won gives the solution, and with a single process this is pasyans_solve.
+    """
+
+    processes = processes or os.cpu_count() or 1
+    cells = pasyans_encode(gs)
+    moves = pasyans_code_moves(cells, pasyans_code_runs(cells))
+    if processes == 1 or len(moves) < 2 or pasyans_code_won(cells):
+        return pasyans_solve(gs, node_limit)
+
+    branch_limit = -(-node_limit // len(moves))  # Rounded up, so every branch gets at least one state
+    with Pool(min(processes, len(moves))) as pool:
+        for solution in pool.imap(pasyans_solve_branch, [(cells, move, branch_limit) for move in moves]):
+            if solution is not None:
+                return solution  # Leaving the pool stops the branches still running
+    return None
 
 
 def pasyans_get_user_command(gs: PasyansGameState):
     """Collects command details from user input."""
 
-    # Collect user input
-    pasyans_input = input('» ').split()
-    user_command = '' if len(pasyans_input) == 0 else pasyans_input[0]
-    user_args = [] if len(pasyans_input) == 0 else pasyans_input[1:]
-
-    # Clear previous turn's command details
-    gs.command = ''
-    gs.command_args = []
+    # Collect user input, split once into the command and its args
+    user_command, *user_args = input('» ').split() or ['']
 
-    for cmd in gs.command_aliases.keys():
-        if user_command in gs.command_aliases[cmd]:
-            gs.command = cmd
-            gs.command_args = user_args
-            break
+    # Replace previous turn's command details, args are only kept for a known command
+    gs.command = PASYANS_ALIAS_TO_COMMAND.get(user_command, '')
+    gs.command_args = user_args if gs.command else []
 
     if gs.command == '':
         gs.status_line = 'invalid command, try `help`'
 
 
+def pasyans_update_sorted_len(gs: PasyansGameState, src_index: int, dst_index: int, dst_len: int, stack_size: int):
+    """Updates the sorted run lengths of both cells after an ordered stack moved between them.
+    dst_len is the length of the destination cell before the move.
+    """
+
+    sorted_len = gs.sorted_len
+
+    # The stack extends the run at the top of dst if it sits on it in a valid order
+    if dst_index != PASYANS_FREE_INDEX:
+        dst_cell = gs.cells[dst_index]
+        if dst_len and PASYANS_VALID_ORDER[dst_cell[dst_len] << 7 | dst_cell[dst_len - 1]]:
+            sorted_len[dst_index] += stack_size
+        else:
+            sorted_len[dst_index] = stack_size
+
+    # What is left of the run at the top of src is still in order, unless the whole run left
+    if src_index != PASYANS_FREE_INDEX:
+        if sorted_len[src_index] > stack_size:
+            sorted_len[src_index] -= stack_size
+        else:
+            src_cell = gs.cells[src_index]
+            sorted_len[src_index] = pasyans_max_stack_size(src_cell) if src_cell else 0
+
+
+def pasyans_apply_move(gs: PasyansGameState, src_index: int, dst_index: int) -> bool:
+    """Moves the largest stack that fits from one cell to another by index, the free cell being PASYANS_FREE_INDEX.
+    Returns whether the move was made, and leaves the reason it wasn't in the status line.
+    """
+
+    src_is_free = src_index == PASYANS_FREE_INDEX
+    dst_is_free = dst_index == PASYANS_FREE_INDEX
+
+    # Check for when source cell is empty
+    src_is_empty = gs.free_cell is None if src_is_free else not gs.cells[src_index]
+    if src_is_empty:
+        gs.status_line = 'source cell is empty, move cannot be performed'
+        return False
+
+    # Check if free cell not already filled
+    elif dst_is_free and gs.free_cell is not None:
+        gs.status_line = 'free cell already contains a card, move cannot be performed'
+        return False
+
+    # A card leaving the free cell must fit on dst like any other single card
+    elif src_is_free:
+        dst_cell = gs.cells[dst_index]
+        src_len, dst_len = 1, len(dst_cell)
+        stack_size = 0
+        if not dst_cell or PASYANS_VALID_ORDER[gs.free_cell << 7 | dst_cell[-1]]:
+            dst_cell.append(gs.free_cell)
+            gs.free_cell = None
+            stack_size = 1
+
+    # The free cell takes the top card of any cell
+    elif dst_is_free:
+        src_cell = gs.cells[src_index]
+        src_len, dst_len = len(src_cell), 0
+        gs.free_cell = src_cell.pop()
+        dst_cell = [gs.free_cell]
+        stack_size = 1
+
+    # Try to move the max stack size to dst, then smaller sizes until one fits
+    else:
+        src_cell, dst_cell = gs.cells[src_index], gs.cells[dst_index]
+        src_len, dst_len = len(src_cell), len(dst_cell)
+        stack_size = pasyans_attempt_move(src_cell, dst_cell, gs.sorted_len[src_index])
+
+    if stack_size == 0:
+        gs.status_line = 'invalid move'
+        return False
+
+    gs.status_line = ''
+    if src_index != dst_index:
+        # Indices only, so no cell is kept alive, with the zobrist key from before the move to check undoing against
+        gs.turn_history.append((src_index, dst_index, stack_size, gs.zobrist_key))
+        pasyans_update_sorted_len(gs, src_index, dst_index, dst_len, stack_size)
+        gs.zobrist_key ^= pasyans_zobrist_delta(src_index, src_len, dst_index, dst_len, dst_cell[dst_len:])
+
+        # Only a move out of a tallest cell can lower the max height, so only then is it measured again
+        if not dst_is_free and len(dst_cell) > gs.max_height:
+            gs.max_height = len(dst_cell)
+        elif not src_is_free and src_len == gs.max_height:
+            gs.max_height = max(map(len, gs.cells))
+    return True
+
+
+def pasyans_undo_move(gs: PasyansGameState) -> bool:
+    """Moves the cards of the last move in the turn history back where they came from, without checking the rules.
+    Returns whether there was a move to undo.
+    """
+
+    if not gs.turn_history:
+        return False
+    src_index, dst_index, stack_size, zobrist_key = gs.turn_history.pop()
+
+    # Take the moved cards back off dst
+    if dst_index == PASYANS_FREE_INDEX:
+        codes, dst_len = [gs.free_cell], 1
+        gs.free_cell = None
+    else:
+        dst_cell = gs.cells[dst_index]
+        dst_len = len(dst_cell)
+        codes = dst_cell[-stack_size:]
+        del dst_cell[-stack_size:]
+
+    # Put them back on src
+    if src_index == PASYANS_FREE_INDEX:
+        src_len = 0
+        gs.free_cell = codes[0]
+    else:
+        src_len = len(gs.cells[src_index])
+        gs.cells[src_index].extend(codes)
+
+    # The key must come back to its snapshot, if it doesn't then rebuild everything cached rather than trust it
+    gs.zobrist_key ^= pasyans_zobrist_delta(dst_index, dst_len, src_index, src_len, codes)
+    if gs.zobrist_key != zobrist_key:
+        gs.refresh()
+        return True
+
+    for index in (src_index, dst_index):
+        if index != PASYANS_FREE_INDEX:
+            cell = gs.cells[index]
+            gs.sorted_len[index] = pasyans_max_stack_size(cell) if cell else 0
+    gs.max_height = max(map(len, gs.cells))
+    return True
+
+
+def pasyans_play_sequence(seed, moves: list) -> bool:
+    """Deals the game for a seed and plays moves on it without any rendering or input, returning whether it is won.
+    Each move starts with its source and destination cell indices, so solutions from pasyans_solve can be replayed.
+    """
+
+    gs = PasyansGameState(seed=seed)
+    for move in moves:
+        pasyans_apply_move(gs, move[0], move[1])
+    return pasyans_check_win(gs)
+
+
 def pasyans_move_command(gs: PasyansGameState):
     """Moves a card from one cell to another."""
 
@@ -122,40 +695,9 @@ def pasyans_move_command(gs: PasyansGameState):
         gs.status_line = 'invalid move arguments, try `move <c> <c>`'
 
     else:
-        src_cell = gs.free_cell if gs.command_args[0] in ['F', 'f'] else gs.cells[int(gs.command_args[0]) - 1]
-        dst_cell = gs.free_cell if gs.command_args[1] in ['F', 'f'] else gs.cells[int(gs.command_args[1]) - 1]
-
-        # Check for when source cell is empty
-        if len(src_cell) == 0:
-            gs.status_line = 'source cell is empty, move cannot be performed'
-
-        # Check if free cell not already filled
-        elif dst_cell is gs.free_cell and gs.free_cell:
-            gs.status_line = 'free cell already contains a card, move cannot be performed'
-
-        # Otherwise, attempt the move
-        else:
-            # Determine the max stack size (number of cards) that could be moved from src
-            stack_size = 1
-            if src_cell is not gs.free_cell and len(src_cell) > 1 and dst_cell is not gs.free_cell:
-                while pasyans_valid_order(src_cell[-stack_size], src_cell[-stack_size - 1]):
-                    stack_size += 1
-                    if stack_size == len(src_cell):
-                        break
-
-            # Try to move max stack size to dst, then repeat with smaller sizes until successful or empty
-            while stack_size > 0:
-                # Check if dst is empty first, always valid if so
-                if len(dst_cell) == 0 or pasyans_valid_order(src_cell[-stack_size], dst_cell[-1]):
-                    dst_cell.extend(src_cell[-stack_size:])  # Copy stack from source to destination cell
-                    del src_cell[-stack_size:]  # Remove stack from source cell
-                    gs.status_line = ''
-                    gs.turn_history.append((src_cell, dst_cell, stack_size))
-                    break
-                stack_size -= 1
-
-            if stack_size == 0:
-                gs.status_line = 'invalid move'
+        src_index = PASYANS_FREE_INDEX if gs.command_args[0] in ['F', 'f'] else int(gs.command_args[0]) - 1
+        dst_index = PASYANS_FREE_INDEX if gs.command_args[1] in ['F', 'f'] else int(gs.command_args[1]) - 1
+        pasyans_apply_move(gs, src_index, dst_index)
 
 
 def pasyans_win_command(gs: PasyansGameState):
@@ -190,12 +732,30 @@ def pasyans_rules_command(gs: PasyansGameState):
 
 def pasyans_undo_command(gs: PasyansGameState):
     """Undoes the previous move."""
-    pass  # TODO implement undo command
+    gs.status_line = '' if pasyans_undo_move(gs) else 'no moves left to undo'
 
 
 def pasyans_solve_command(gs: PasyansGameState):
     """Tries to automatically solve the current 'game', displaying the necessary moves if possible, then resetting."""
-    pass  # TODO implement solve command
+
+    solution = pasyans_solve_parallel(gs)
+
+    if solution is None:
+        gs.status_line = 'no solution found, keep going!'
+
+    else:
+        names = gs.cell_names[:PASYANS_FREE_INDEX + 1]
+        print('solved in ' + str(len(solution)) + ' moves:')
+        print(', '.join(names[src] + ' ' + names[dst] for src, dst, _ in solution))
+        input('press enter to deal a new game » ')
+        gs.is_won = True
+
+
+PASYANS_COMMANDS = {'move': pasyans_move_command,  # For dispatching a command to the function that runs it
+                    'win': pasyans_win_command,
+                    'exit': pasyans_exit_command,
+                    'solve': pasyans_solve_command,
+                    'undo': pasyans_undo_command}
 
 
 def pasyans_main(debug_mode=False):
@@ -205,7 +765,8 @@ def pasyans_main(debug_mode=False):
     The game loop represents the current 'game' of Pasyans and iterates through turns of the 'game'.
     """
 
-    # Create the game state
+    # Make sure the terminal can draw frames, then create the game state
+    pasyans_enable_ansi()
     pasyans_gs = PasyansGameState(debug_mode)
 
     # Session loop, resets game after win achieved
@@ -220,14 +781,9 @@ def pasyans_main(debug_mode=False):
             # Collect user input to determine the command
             pasyans_get_user_command(pasyans_gs)
 
-            if pasyans_gs.command == 'move':
-                pasyans_move_command(pasyans_gs)
-
-            elif pasyans_gs.command == 'win':
-                pasyans_win_command(pasyans_gs)
-
-            elif pasyans_gs.command == 'exit':
-                pasyans_exit_command(pasyans_gs)
+            # Run the command, unknown commands were already reported in the status line
+            if pasyans_gs.command in PASYANS_COMMANDS:
+                PASYANS_COMMANDS[pasyans_gs.command](pasyans_gs)
 
         if not pasyans_gs.ready_to_exit:
             pasyans_gs.is_won = False
@@ -236,6 +792,6 @@ def pasyans_main(debug_mode=False):
 
 if __name__ == '__main__':  # Main guard
 
-    debug_flag = '-d' in argv[1:] or '--debug' in argv[1:]
+    debug_flag = '-d' in sys.argv[1:] or '--debug' in sys.argv[1:]
 
     pasyans_main(debug_flag)